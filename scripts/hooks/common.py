@@ -2,88 +2,711 @@
 """
 Shared utilities for Swarm1 Claude Code hooks.
 - Strict Swarm gating (AUV-only) and mode handling (off|warn|block)
-- Error-tolerant JSONL logging and safe stdin parsing
+- Error-tolerant JSONL logging (buffered, one append per process) and safe stdin parsing
+  (streamed for payloads of 32 MB or more when ijson is installed)
+- Log scanning that byte-filters lines (session id, agent) before parsing them, and a
+  sidecar hooks.idx (session id -> line offsets) to skip the scan entirely
 - Circuit breaker to avoid IDE wedging when hooks fail repeatedly
 - Session log offset utilities to avoid heavy scans
+- Parsed-YAML cache so policy/registry files are not re-parsed per hook
 """
 
 from __future__ import annotations
-import os, sys, json, time, pathlib
+import os, sys, json, time, atexit, functools
 from typing import Any, Dict, Optional, Tuple
+from common_gate import is_swarm, get_mode, env_disabled, env_active  # type: ignore
 
 
 # ------------- Paths & Environment -------------
 
+# Resolved root is exported so processes spawned from a hook skip the walk;
+# preset it (e.g. in the hook command's environment) to skip it in the hooks too
+ROOT_ENV = "SWARM1_PROJECT_DIR"
+
+
+@functools.lru_cache(maxsize=1)
 def project_root(start: str) -> str:
+  cached = os.environ.get(ROOT_ENV)
+  if cached and os.path.isdir(cached):
+    return cached
+  root = None
   cur = os.path.abspath(start)
   for _ in range(8):
     if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-      return cur
+      root = cur
+      break
     parent = os.path.dirname(cur)
     if parent == cur:
       break
     cur = parent
-  return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
+  root = root or os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
+  os.environ[ROOT_ENV] = root
+  return root
 
 
 PROJECT_DIR = project_root(os.getcwd())
 OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
 LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
+IDX_PATH = os.path.join(OBS_DIR, "hooks.idx")
 LEDGER_DIR = os.path.join(OBS_DIR, "ledgers")
 SESSION_DIR = os.path.join(PROJECT_DIR, ".claude", "session")
 SENTINELS_DIR = os.path.join(PROJECT_DIR, ".claude")
 CB_SENTINEL = os.path.join(SENTINELS_DIR, "hooks.disabled")
+# runs/<AUV>/result-cards/<name>, joined by concatenation (see card_path)
+_CARDS_HEAD = os.path.join(PROJECT_DIR, "runs") + os.sep
+_CARDS_TAIL = os.sep + "result-cards" + os.sep
 
 
-def mkdirs() -> None:
-  pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
-  pathlib.Path(LEDGER_DIR).mkdir(parents=True, exist_ok=True)
-  pathlib.Path(SESSION_DIR).mkdir(parents=True, exist_ok=True)
-  pathlib.Path(SENTINELS_DIR).mkdir(parents=True, exist_ok=True)
+SUBAGENT_CARDS = "subagent-cards.jsonl"  # SubagentStop cards, one JSON object per line
 
 
-# ------------- Gating & Modes -------------
+def card_path(auv: str, name: str) -> str:
+  return _CARDS_HEAD + auv + _CARDS_TAIL + name
 
-def is_swarm() -> bool:
-  # Strict AUV-only gating; no SWARM_ACTIVE shortcut for processing
-  return bool(os.getenv("AUV_ID"))
 
+def read_subagent_card(auv: str, session_id: Any, agent: str) -> Optional[Dict[str, Any]]:
+  """Latest SubagentStop card for session_id + agent (the former
+  result-cards/subagent-<agent>-<session>.json), or None."""
+  card = None
+  for c in iter_jsonl(card_path(auv, SUBAGENT_CARDS), needles=(needle(session_id), needle(agent))):
+    if c.get("session_id") == session_id and c.get("agent") == agent:
+      card = c
+  return card
 
-def get_mode() -> str:
-  # off | warn | block (default to off for normal coding sessions)
-  mode = (os.getenv("HOOKS_MODE") or "off").strip().lower()
-  return mode if mode in ("off", "warn", "block") else "off"
+
+_DIRS_READY = False
+
+
+def mkdirs(force: bool = False) -> None:
+  """Create the runtime directories once per process; force re-checks (after ENOENT)."""
+  global _DIRS_READY
+  if _DIRS_READY and not force:
+    return
+  for d in (OBS_DIR, LEDGER_DIR, SESSION_DIR, SENTINELS_DIR):
+    os.makedirs(d, exist_ok=True)
+  _DIRS_READY = True
 
 
+# ------------- Gating & Modes -------------
+# is_swarm / get_mode / env_active live in common_gate (importable without this module)
+
 def disabled() -> bool:
-  if (os.getenv("CLAUDE_DISABLE_HOOKS", "").lower() in ("1", "true", "yes")):
-    return True
-  return os.path.exists(CB_SENTINEL)
+  return env_disabled() or os.path.exists(CB_SENTINEL)
+
+
+def active() -> bool:
+  """All gates in one call, cheapest first: env lookups before the sentinel stat.
+  Hooks check this before touching stdin so a no-op spawn does no parsing."""
+  return env_active() and not os.path.exists(CB_SENTINEL)
+
+
+def emit_empty_cards() -> bool:
+  # SWARM1_EMIT_EMPTY_CARDS=1: SubagentStop writes its card/log line even when the
+  # agent ran no tools (skipped by default)
+  return os.getenv("SWARM1_EMIT_EMPTY_CARDS", "").lower() in ("1", "true", "yes")
+
+
+# ------------- JSON -------------
+
+# Optional dependency: orjson (fast JSON encode/decode on the hook hot path).
+# Imported on first use so gated-off hooks never pay for it; the hooks fall
+# back to the stdlib json module if orjson is unavailable.
+_orjson: Any = False  # False = not tried yet, None = unavailable
+
+
+def _fast_json() -> Any:
+  global _orjson
+  if _orjson is False:
+    try:
+      import orjson as mod  # type: ignore
+    except Exception:  # pragma: no cover
+      mod = None
+    _orjson = mod
+  return _orjson
+
+
+def dumps(obj: Any, pretty: bool = False, sort_keys: bool = False) -> bytes:
+  """Serialize to compact UTF-8 JSON bytes (orjson when available); pretty indents by 2.
+  Both encoders emit the same compact form (no spaces after "," or ":")."""
+  fast = _fast_json()
+  if fast is not None:
+    try:
+      opt = (fast.OPT_INDENT_2 if pretty else 0) | (fast.OPT_SORT_KEYS if sort_keys else 0)
+      return fast.dumps(obj, option=opt) if opt else fast.dumps(obj)
+    except TypeError:
+      pass  # e.g. lone surrogates; let stdlib handle it
+  return json.dumps(
+    obj, ensure_ascii=False, indent=2 if pretty else None,
+    separators=None if pretty else (",", ":"), sort_keys=sort_keys,
+  ).encode("utf-8", "replace")
+
+
+def loads(data: Any) -> Any:
+  """Parse JSON from bytes or str (orjson when available)."""
+  fast = _fast_json()
+  if fast is not None:
+    try:
+      return fast.loads(data)
+    except ValueError:
+      pass  # e.g. BOM or big ints; let stdlib decide
+  return json.loads(data)
 
 
 # ------------- IO Helpers -------------
 
-def safe_read_stdin_json() -> Dict[str, Any]:
+# ijson runs a Python callback per token, ~5x slower than a full orjson parse, so it
+# only pays where the parsed object itself is the problem: at 32 MB a full parse
+# builds several hundred MB and neither path fits the 2 s hook timeout anyway
+STREAM_MIN_BYTES = 32 << 20
+
+
+def _stdin_bytes() -> Optional[Any]:
   try:
     if getattr(sys.stdin, "isatty", lambda: False)():
-      return {}
+      return None
   except Exception:
+    return None
+  return getattr(sys.stdin, "buffer", sys.stdin)
+
+
+def _parse_payload(data: Any) -> Dict[str, Any]:
+  try:
+    inp = loads(data) if data else {}
+  except ValueError:
     return {}
-  data = sys.stdin.read()
+  return inp if type(inp) is dict else {}
+
+
+_TRUNC_FLAGS = (os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0))
+
+
+def write_json(path: str, obj: Any, pretty: bool = False) -> None:
+  """Replace path with obj serialized in one buffer and one os.write (result cards,
+  ledgers, session offsets); no io-layer buffer is set up. The parent dir is only
+  created when the open hits ENOENT (first write, or runs/ removed under hookd)."""
+  payload = memoryview(dumps(obj, pretty))
+  try:
+    fd = os.open(path, _TRUNC_FLAGS, 0o644)
+  except FileNotFoundError:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, _TRUNC_FLAGS, 0o644)
+  try:
+    while payload:
+      payload = payload[os.write(fd, payload):]
+  finally:
+    os.close(fd)
+
+
+def safe_read_stdin_json() -> Dict[str, Any]:
+  """The hook payload: raw stdin bytes (no text decode) parsed by loads(); {} on a
+  tty, empty input, bad JSON or a non-object payload."""
+  stream = _stdin_bytes()
+  return _parse_payload(stream.read()) if stream is not None else {}
+
+
+class _Prefixed:
+  """File-like reader that replays already-read bytes before the rest of a stream,
+  keeping what it read from the stream so a failed streaming parse can be redone."""
+
+  def __init__(self, head: bytes, stream: Any):
+    self._head = head
+    self._stream = stream
+    self.consumed = [head]
+
+  def read(self, n: int = -1) -> bytes:
+    if self._head:
+      n = len(self._head) if n is None or n < 0 else n
+      out, self._head = self._head[:n], self._head[n:]
+      return out
+    out = self._stream.read(n)
+    self.consumed.append(out)
+    return out
+
+  def replay(self) -> bytes:
+    """The whole payload: everything read so far plus the unread rest."""
+    return b"".join(self.consumed) + self._stream.read()
+
+
+class _JsonProbe:
+  """Re-serializes parser events as compact JSON, keeping only the length and a prefix.
+  Top-level members named in keep are recorded in fields; a container is recorded as
+  an empty or one-item stand-in of the same type, so only its truthiness is kept."""
+
+  def __init__(self, head_bytes: int, keep: Tuple[str, ...] = ()):
+    self.size = 0
+    self.head = bytearray()
+    self.fields: Dict[str, Any] = {}
+    self._limit = head_bytes
+    self._keep = keep
+    self._key = None
+    self._stack: list = []  # per open container: [is_map, has_items]
+    self._opened = None  # kept member whose container was just opened
+
+  def _emit(self, b: bytes) -> None:
+    self.size += len(b)
+    room = self._limit - len(self.head)
+    if room > 0:
+      self.head += b[:room]
+
+  def event(self, event: str, value: Any) -> None:
+    if self._opened is not None:
+      # first event inside a kept container: its end (empty) or a first child
+      if event not in ("end_map", "end_array"):
+        self.fields[self._opened] = {value: True} if event == "map_key" else [True]
+      self._opened = None
+    if event in ("end_map", "end_array"):
+      self._stack.pop()
+      self._emit(b"}" if event == "end_map" else b"]")
+      return
+    top = self._stack[-1] if self._stack else None
+    if top is not None and (event == "map_key" or not top[0]):
+      # comma before every map key / array element except the first
+      if top[1]:
+        self._emit(b",")
+      top[1] = True
+    if event == "map_key":
+      self._key = value
+      self._emit(dumps(value) + b":")
+      return
+    if len(self._stack) == 1 and top[0] and self._key in self._keep:
+      if event == "start_map":
+        self.fields[self._key], self._opened = {}, self._key
+      elif event == "start_array":
+        self.fields[self._key], self._opened = [], self._key
+      else:
+        self.fields[self._key] = value
+    if event == "start_map":
+      self._stack.append([True, False])
+      self._emit(b"{")
+    elif event == "start_array":
+      self._stack.append([False, False])
+      self._emit(b"[")
+    else:
+      self._emit(dumps(value))
+
+
+def _feed_subtree(sink: Any, event: str, value: Any, events: Any) -> None:
+  depth = 0
+  while True:
+    sink.event(event, value)
+    if event in ("start_map", "start_array"):
+      depth += 1
+    elif event in ("end_map", "end_array"):
+      depth -= 1
+      if depth == 0:
+        return
+    _, event, value = next(events)
+
+
+def read_stdin_json_streaming(skip_key: str, head_bytes: int = 1000,
+                              keep: Tuple[str, ...] = ()) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+  """Parse the stdin payload without materializing a large object/array at inp[skip_key].
+  Returns (inp, probe). probe is None when the payload was parsed whole (under
+  STREAM_MIN_BYTES, ijson unavailable, or skip_key absent/scalar). Otherwise
+  skip_key is left out of inp and probe is {"size", "head", "fields"}: the
+  compact-JSON byte length of the skipped value, its first head_bytes bytes, and
+  its top-level members named in keep."""
+  stream = _stdin_bytes()
+  if stream is None:
+    return {}, None
+  head = stream.read(STREAM_MIN_BYTES)
+  if len(head) < STREAM_MIN_BYTES:
+    return _parse_payload(head), None
   try:
-    return json.loads(data) if data else {}
+    import ijson  # type: ignore  # optional dependency
   except Exception:
-    return {}
+    return _parse_payload(head + stream.read()), None
+  src = _Prefixed(head, stream)
+  try:
+    events = ijson.parse(src, use_float=True)
+    first = next(events, None)
+    if not first or first[1] != "start_map":
+      return {}, None
+    inp: Dict[str, Any] = {}
+    probe = None
+    key = None
+    for _, event, value in events:
+      if event == "map_key":
+        key = value
+      elif event in ("start_map", "start_array"):
+        sink = _JsonProbe(head_bytes, keep) if key == skip_key else ijson.ObjectBuilder()
+        _feed_subtree(sink, event, value, events)
+        if key == skip_key:
+          probe = {"size": sink.size, "head": bytes(sink.head), "fields": sink.fields}
+        else:
+          inp[key] = sink.value
+      elif event == "end_map":
+        break
+      else:
+        inp[key] = value
+    return inp, probe
+  except Exception:
+    # Valid JSON ijson rejects (e.g. yajl2_c's "integer overflow" past int64):
+    # parse the buffered payload whole, as if it had never been streamed
+    try:
+      return _parse_payload(src.replay()), None
+    except OSError:
+      return {}, None
 
 
-def safe_append_jsonl(obj: Dict[str, Any]) -> None:
+_LOG_BUFFER: list[bytes] = []
+_LOG_SIDS: list = []  # session id of each buffered line, for hooks.idx
+_LOG_FD: Optional[int] = None
+_IDX_FD: Optional[int] = None
+_LOG_FLAGS = (os.O_WRONLY | os.O_APPEND | os.O_CREAT
+              | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0))
+
+
+def _rotated(fd: int) -> bool:
+  # The cached fd no longer is LOG_PATH (renamed away or deleted by log rotation)
   try:
-    mkdirs()
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-      f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    st, cur = os.fstat(fd), os.stat(LOG_PATH)
+  except OSError:
+    return True
+  return (st.st_ino, st.st_dev) != (cur.st_ino, cur.st_dev)
+
+
+def _log_fd() -> int:
+  # O_APPEND: each write lands atomically at EOF, even with concurrent hooks.
+  # Kept open for the process; a long-lived one (hookd) reopens after rotation.
+  global _LOG_FD, _IDX_FD
+  if _LOG_FD is not None and _rotated(_LOG_FD):
+    for fd in (_LOG_FD, _IDX_FD):
+      if fd is not None:
+        try:
+          os.close(fd)
+        except OSError:
+          pass
+    _LOG_FD = _IDX_FD = None
+  if _LOG_FD is None:
+    try:
+      _LOG_FD = os.open(LOG_PATH, _LOG_FLAGS, 0o644)
+    except FileNotFoundError:
+      mkdirs(force=True)  # first event in a fresh project, or runs/ was removed
+      _LOG_FD = os.open(LOG_PATH, _LOG_FLAGS, 0o644)
+  return _LOG_FD
+
+
+def _idx_head(head: bytes) -> Optional[Tuple[int, int]]:
+  # "#base <log size> <log inode>": lines before base are not indexed, and the
+  # index only describes the log file with that inode
+  try:
+    tag, base, ino = head.split()
+    return (int(base), int(ino)) if tag == b"#base" else None
+  except ValueError:
+    return None
+
+
+def _idx_lock(fd: int) -> Any:
+  # Held while appending records or replacing hooks.idx, so no writer appends to an
+  # index that was just replaced without noticing. Returns the unlock callable.
+  try:
+    import fcntl
+  except ImportError:  # pragma: no cover - Windows: best effort, unlocked
+    return lambda: None
+  fcntl.flock(fd, fcntl.LOCK_EX)
+  return lambda: fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _idx_current(fd: int) -> bool:
+  try:
+    st, cur = os.fstat(fd), os.stat(IDX_PATH)
+  except OSError:
+    return False
+  return (st.st_ino, st.st_dev) == (cur.st_ino, cur.st_dev)
+
+
+def _write_idx_head(log_fd: int, install: Any) -> None:
+  st = os.fstat(log_fd)
+  tmp = f"{IDX_PATH}.{os.getpid()}.tmp"
+  try:
+    with open(tmp, "wb") as f:
+      f.write(b"#base %d %d\n" % (st.st_size, st.st_ino))
+    install(tmp, IDX_PATH)
+  finally:
+    try:
+      os.unlink(tmp)
+    except OSError:
+      pass
+
+
+def _reset_index(log_fd: int) -> None:
+  """Replace hooks.idx with a header at the log's current size, so every line written
+  so far is outside the index and readers scan for it. For an index describing a
+  rotated/truncated log, and for a flush whose lines could not all be indexed."""
+  global _IDX_FD
+  if _IDX_FD is not None:
+    try:
+      os.close(_IDX_FD)
+    except OSError:
+      pass
+    _IDX_FD = None
+  try:
+    for _ in range(8):
+      try:
+        cur = os.open(IDX_PATH, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+      except FileNotFoundError:
+        return  # the next writer creates one, based past every line written so far
+      try:
+        unlock = _idx_lock(cur)
+        try:
+          if _idx_current(cur):  # else replaced meanwhile: lock the new one
+            _write_idx_head(log_fd, os.replace)
+            return
+        finally:
+          unlock()
+      finally:
+        os.close(cur)
+  except OSError:
+    pass
+  try:
+    os.unlink(IDX_PATH)  # could not rewrite it: no index beats a partial one
+  except OSError:
+    pass
+
+
+def _idx_fd(log_fd: int) -> int:
+  """Open hooks.idx for append. A missing index, or one describing a rotated or
+  truncated log, is (re)created atomically with a fresh header."""
+  global _IDX_FD
+  if _IDX_FD is None:
+    st = os.fstat(log_fd)
+    try:
+      with open(IDX_PATH, "rb") as f:
+        head = _idx_head(f.readline())
+      if head is None or head[1] != st.st_ino or head[0] > st.st_size:
+        _reset_index(log_fd)
+    except FileNotFoundError:
+      try:
+        _write_idx_head(log_fd, os.link)  # atomic create-with-header
+      except FileExistsError:
+        pass  # a concurrent creator won
+    _IDX_FD = os.open(IDX_PATH, _LOG_FLAGS & ~os.O_CREAT)
+  return _IDX_FD
+
+
+def _append_index(idx: int, offset: int, lines: list, sids: list) -> bool:
+  """Append the records of lines written at offset; True only if all of them reached
+  the live hooks.idx."""
+  from binascii import crc32
+  recs = []
+  for line, sid in zip(lines, sids):
+    if sid is not None:
+      recs.append(b"%d %d %08x %s\n" % (offset, len(line), crc32(line), needle(sid)))
+    offset += len(line)
+  data = b"".join(recs)
+  unlock = _idx_lock(idx)
+  try:
+    return os.write(idx, data) == len(data) and _idx_current(idx)
+  finally:
+    unlock()
+
+
+def flush_log() -> None:
+  """Append all buffered JSONL lines to LOG_PATH with one os.write, then index them."""
+  if not _LOG_BUFFER:
+    return
+  lines, sids = _LOG_BUFFER[:], _LOG_SIDS[:]
+  _LOG_BUFFER.clear()
+  _LOG_SIDS.clear()
+  payload = b"".join(lines)
+  try:
+    fd = _log_fd()
   except Exception:
     # Never wedge IDE on logging failure
     return
+  idx = None
+  indexed = not any(sid is not None for sid in sids)  # nothing to index
+  if not indexed:
+    try:
+      idx = _idx_fd(fd)  # before the write, so base never covers these lines
+    except Exception:
+      idx = None
+  try:
+    n = os.write(fd, payload)
+    if idx is not None and n == len(payload):
+      # O_APPEND leaves our offset just past our own bytes, whoever else appended
+      try:
+        indexed = _append_index(idx, os.lseek(fd, 0, os.SEEK_CUR) - n, lines, sids)
+      except Exception:
+        pass
+    rest = memoryview(payload)[n:]
+    while rest:
+      rest = rest[os.write(fd, rest):]
+  except Exception:
+    pass
+  if not indexed:
+    # Some session lines are in the log but not in hooks.idx: rebase the index past
+    # them so read_indexed() never vouches for those sessions
+    try:
+      _reset_index(fd)
+    except Exception:
+      pass
+
+
+def _close_log() -> None:
+  global _LOG_FD, _IDX_FD
+  flush_log()
+  for fd in (_LOG_FD, _IDX_FD):
+    if fd is not None:
+      try:
+        os.close(fd)
+      except OSError:
+        pass
+  _LOG_FD = _IDX_FD = None
+
+
+atexit.register(_close_log)
+
+
+def safe_append_jsonl(obj: Dict[str, Any], flush: bool = False) -> None:
+  """Buffer one JSONL line; written at process exit, or now if flush=True.
+  Lines are canonical: compact with sorted keys, so readers can probe bytes."""
+  try:
+    _LOG_BUFFER.append(dumps(obj, sort_keys=True) + b"\n")
+  except Exception:
+    return
+  _LOG_SIDS.append(obj.get("session_id"))
+  if flush:
+    flush_log()
+
+
+def needle(value: Any) -> bytes:
+  """value as it appears inside a log line; a filter for iter_jsonl."""
+  return dumps(value)
+
+
+# Only PostToolUse lines are tallied. The quoted value, not the whole member: logs
+# written before the compact form have "event": "PostToolUse" (with a space), and
+# the tallies check the event field anyway. Equal to needle("PostToolUse").
+POST_TOOL_NEEDLE = b'"PostToolUse"'  # literal: no encoder import at module load
+
+
+def _iter_lines(mm: Any, start: int, needles: Tuple[bytes, ...]):
+  # Jump between hits of the first needle with mm.find; the remaining needles are
+  # searched inside the mapped line too, so only matching lines are ever copied.
+  end = len(mm)
+  pos = start
+  first, rest = (needles[0], needles[1:]) if needles else (None, ())
+  while pos < end:
+    if first is not None:
+      hit = mm.find(first, pos)
+      if hit == -1:
+        return
+      if hit > pos:
+        pos = max(pos, mm.rfind(b"\n", pos, hit) + 1)
+    nl = mm.find(b"\n", pos)
+    if nl == -1:
+      nl = end
+    if all(mm.find(n, pos, nl) != -1 for n in rest):
+      yield mm[pos:nl]
+    pos = nl + 1
+
+
+def iter_jsonl(path: str, start: int = 0, needles: Tuple[bytes, ...] = ()):
+  """Yield parsed events from path, beginning at byte offset start.
+  Lines not containing every one of needles (see needle()) are skipped unparsed;
+  callers still compare the parsed fields, a needle can match elsewhere in a line."""
+  import mmap
+  try:
+    with open(path, "rb") as f:
+      if os.fstat(f.fileno()).st_size <= start:
+        return  # also avoids mapping an empty file
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+          mm.madvise(mmap.MADV_SEQUENTIAL)
+        for line in _iter_lines(mm, start, needles):
+          if not line or line.isspace():
+            continue
+          try:  # JSON parsers skip the surrounding whitespace (e.g. \r) themselves
+            ev = loads(line)
+          except ValueError:  # JSONDecodeError (both parsers), UnicodeDecodeError
+            continue
+          if type(ev) is dict:  # callers use .get(); a stray scalar/array line is skipped
+            yield ev
+  except FileNotFoundError:
+    return
+
+
+def read_indexed(session_id: Any, needles: Tuple[bytes, ...] = ()) -> Optional[list]:
+  """Events of session_id located through hooks.idx, keeping lines that contain all
+  needles. None when the index is missing or cannot vouch for the whole session
+  (it describes another log file, started after the session, or any record no
+  longer matches its line's crc32); callers then scan."""
+  from binascii import crc32
+  key = needle(session_id)
+  tail = b" " + key
+  spans = []
+  try:
+    with open(IDX_PATH, "rb") as f:
+      head = _idx_head(f.readline())
+      if head is None:
+        return None
+      base, ino = head
+      start = _offset_record(session_id)
+      if base > int(start.get("size", 0)):
+        return None  # session (or its SessionStart) predates the index
+      pos = start.get("idx")
+      if pos and pos[0] == os.fstat(f.fileno()).st_ino and pos[1] > f.tell():
+        # Records before SessionStart belong to earlier lines: start at the index
+        # size saved then, a record boundary (a torn append rebases the index)
+        f.seek(pos[1] - 1)
+        if f.read(1) != b"\n":
+          return None
+      for rec in f:
+        rec = rec.rstrip(b"\n")
+        if rec.endswith(tail):
+          off, ln, crc, _ = rec.split(b" ", 3)
+          spans.append((int(off), int(ln), int(crc, 16)))
+    if len({s[0] for s in spans}) != len(spans):
+      return None  # one offset indexed twice: records from a replaced log
+    events = []
+    with open(LOG_PATH, "rb") as f:
+      st = os.fstat(f.fileno())
+      if st.st_ino != ino or st.st_size < base:
+        return None  # log rotated, replaced or truncated since the index was started
+      for off, ln, crc in sorted(spans):  # log order; index appends can interleave
+        if off + ln > st.st_size:
+          return None
+        f.seek(off)
+        line = f.read(ln)
+        if crc32(line) != crc:
+          return None  # offsets no longer describe this log
+        if all(n in line for n in needles):
+          try:
+            events.append(loads(line))
+          except ValueError:
+            continue
+    return events
+  except (OSError, ValueError, TypeError):  # incl. a malformed offset record
+    return None
+
+
+_ANY = object()
+
+
+def tally_tools(events: Any, session_id: Any, agent: Any = _ANY) -> Dict[Tuple[Any, bool], int]:
+  """(tool, ok) -> count over the PostToolUse events of session_id (and agent).
+  Counter(iterable) does the counting in C; event type is checked first."""
+  from collections import Counter
+  return Counter(
+    (e.get("tool") or "unknown", bool(e.get("ok")))
+    for e in events
+    if e.get("event") == "PostToolUse" and e.get("session_id") == session_id
+    and (agent is _ANY or e.get("agent") == agent)
+  )
+
+
+def tool_summary(counts: Dict[Tuple[Any, bool], int]) -> Tuple[Dict[str, Dict[str, int]], int, int]:
+  """Pivot a (tool, ok) -> events tally into (per_tool {"ok", "fail"}, total, failures)."""
+  per_tool: Dict[str, Dict[str, int]] = {}
+  failures = 0
+  for (t, ok), n in counts.items():
+    per_tool.setdefault(t, {"ok": 0, "fail": 0})["ok" if ok else "fail"] = n
+    if not ok:
+      failures += n
+  return per_tool, sum(counts.values()), failures
 
 
 # ------------- Circuit Breaker -------------
@@ -100,12 +723,11 @@ def record_error(session_id: Optional[str], trip_after: int = None) -> bool:
     path = _errors_file(session_id)
     count = 0
     if os.path.exists(path):
-      with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f) or {}
+      with open(path, "rb") as f:
+        data = loads(f.read()) or {}
         count = int(data.get("count", 0))
     count += 1
-    with open(path, "w", encoding="utf-8") as f:
-      json.dump({"count": count, "ts": time.time()}, f)
+    write_json(path, {"count": count, "ts": time.time()})
     # Determine threshold
     default_trip = 3
     try:
@@ -121,7 +743,13 @@ def record_error(session_id: Optional[str], trip_after: int = None) -> bool:
 def trip_circuit_breaker() -> None:
   try:
     mkdirs()
-    pathlib.Path(CB_SENTINEL).write_text("tripped\n", encoding="utf-8")
+    try:
+      f = open(CB_SENTINEL, "w", encoding="utf-8")
+    except FileNotFoundError:
+      mkdirs(force=True)  # .claude/ removed since this process created it
+      f = open(CB_SENTINEL, "w", encoding="utf-8")
+    with f:
+      f.write("tripped\n")
   except Exception:
     return
 
@@ -135,25 +763,88 @@ def session_offset_path(session_id: Optional[str]) -> str:
 
 
 def save_offset(session_id: Optional[str]) -> None:
+  """Record the log size (and hooks.idx inode/size) at SessionStart: the session's
+  lines, and their index records, all come after these positions."""
   try:
     size = os.path.getsize(LOG_PATH) if os.path.exists(LOG_PATH) else 0
-    with open(session_offset_path(session_id), "w", encoding="utf-8") as f:
-      json.dump({"size": int(size), "ts": time.time()}, f)
+    data = {"size": int(size), "ts": time.time()}
+    try:
+      st = os.stat(IDX_PATH)
+      data["idx"] = [st.st_ino, st.st_size]
+    except OSError:
+      pass
+    write_json(session_offset_path(session_id), data)
   except Exception:
     return
 
 
-def load_offset(session_id: Optional[str]) -> int:
+def _offset_record(session_id: Optional[str]) -> Dict[str, Any]:
   try:
-    with open(session_offset_path(session_id), "r", encoding="utf-8") as f:
-      data = json.load(f) or {}
-      return int(data.get("size", 0))
+    with open(session_offset_path(session_id), "rb") as f:
+      data = loads(f.read())
+    return data if type(data) is dict else {}
   except Exception:
+    return {}
+
+
+def load_offset(session_id: Optional[str]) -> int:
+  try:
+    return int(_offset_record(session_id).get("size", 0))
+  except (TypeError, ValueError):
     return 0
 
 
 # ------------- Config -------------
 
+def _yaml_load(f) -> Any:
+  # Optional dependency: PyYAML; prefer the LibYAML-backed loader
+  import yaml  # type: ignore
+  loader = getattr(yaml, "CSafeLoader", None) or yaml.SafeLoader
+  return yaml.load(f, Loader=loader)
+
+
+_YAML_MEMO: Dict[str, Tuple[Any, Any]] = {}  # path -> (stamp, data), for long-lived processes
+
+
+def load_yaml_cached(path: str) -> Dict[str, Any]:
+  """Parse a YAML file, reusing a pickled copy while its mtime/size are unchanged.
+  Returns {} if the file is missing, unparsable, or PyYAML is unavailable."""
+  try:
+    st = os.stat(path)
+  except OSError:
+    return {}
+  stamp = (st.st_mtime_ns, st.st_size)
+  memo = _YAML_MEMO.get(path)
+  if memo and memo[0] == stamp:
+    return memo[1]
+  import pickle, zlib
+  key = zlib.crc32(os.path.abspath(path).encode("utf-8"))
+  cache = os.path.join(SESSION_DIR, f"yaml-{key:08x}.pkl")
+  try:
+    with open(cache, "rb") as f:
+      cached_stamp, data = pickle.load(f)
+    if cached_stamp == stamp:
+      _YAML_MEMO[path] = (stamp, data)
+      return data
+  except Exception:
+    pass
+  try:
+    with open(path, "rb") as f:
+      data = _yaml_load(f) or {}
+  except Exception:
+    return {}
+  try:
+    mkdirs()
+    tmp = f"{cache}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+      pickle.dump((stamp, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache)
+  except Exception:
+    pass
+  _YAML_MEMO[path] = (stamp, data)
+  return data
+
+
 def max_log_bytes() -> int:
   # default 10 MB cap for heavy scans
   mb = 10
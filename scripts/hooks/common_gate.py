@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Environment-only gates for Swarm1 hooks (imports nothing beyond os).
+- Hooks call env_active() before importing common, so a gated-off spawn skips
+  json/typing imports and project-root discovery entirely
+- common re-exports these; the .claude/hooks.disabled sentinel is checked there
+"""
+
+import os
+
+
+def is_swarm() -> bool:
+  # Strict AUV-only gating; no SWARM_ACTIVE shortcut for processing
+  return bool(os.getenv("AUV_ID"))
+
+
+def get_mode() -> str:
+  # off | warn | block (default to off for normal coding sessions)
+  mode = (os.getenv("HOOKS_MODE") or "off").strip().lower()
+  return mode if mode in ("off", "warn", "block") else "off"
+
+
+def env_disabled() -> bool:
+  return os.getenv("CLAUDE_DISABLE_HOOKS", "").lower() in ("1", "true", "yes")
+
+
+def env_active() -> bool:
+  """Every gate that needs no filesystem access; common.active() adds the sentinel."""
+  return is_swarm() and get_mode() != "off" and not env_disabled()
@@ -0,0 +1,21 @@
+#!/bin/sh
+# Swarm1 - shell-level gate in front of the Python hooks
+#   sh scripts/hooks/hook.sh pre_tool   (likewise post_tool, session_start, session_end, subagent_stop)
+# Exits 0 without starting Python in the states where every hook is a no-op
+# (common.active() is False); anything it cannot rule out is left to Python.
+case "$1" in
+  pre_tool|post_tool|session_start|session_end|subagent_stop) ;;
+  *) exit 0 ;;
+esac
+
+[ -n "$AUV_ID" ] || exit 0
+case "$HOOKS_MODE" in ""|off|OFF|Off) exit 0 ;; esac
+case "$CLAUDE_DISABLE_HOOKS" in 1|true|TRUE|True|yes|YES|Yes) exit 0 ;; esac
+[ -e .claude/hooks.disabled ] && exit 0
+
+case "$0" in */*) dir="${0%/*}" ;; *) dir=. ;; esac
+# Warm daemon running (HOOKS_DAEMON=1): go through the socket shim
+if [ -S "${CLAUDE_PROJECT_DIR:-.}/.claude/session/hookd.sock" ]; then
+  exec python -S "$dir/hookc.py" "$1"
+fi
+exec python "$dir/$1.py"
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Swarm1 - hook client shim for the optional hook daemon (hookd.py)
+- Forwards stdin + environment to the daemon over a Unix socket
+- Relays the daemon's exit code and stderr back to Claude Code
+- Falls back to the regular hook script whenever the daemon is unreachable
+- Never fails open: a PreTool the daemon did not answer in time is blocked in block mode
+
+Stdlib-only and import-light so it can run under `python -S`:
+  python -S scripts/hooks/hookc.py pre_tool
+"""
+import os, sys, time, socket, struct
+
+HOOKS = ("pre_tool", "post_tool", "session_start", "session_end", "subagent_stop")
+REQ = struct.Struct("!IId")  # meta length, payload length, client deadline (epoch seconds)
+RESP = struct.Struct("!iI")  # exit code, stderr length
+TIMEOUT = 1.5  # seconds; Claude Code kills hooks after 2
+
+
+def sock_path() -> str:
+    root = os.environ.get("CLAUDE_PROJECT_DIR") or os.getcwd()
+    return os.path.join(root, ".claude", "session", "hookd.sock")
+
+
+def recv_exact(conn, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame")
+        buf += chunk
+    return bytes(buf)
+
+
+def _script(hook: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), hook + ".py")
+
+
+def _fallback_exec(hook: str) -> None:
+    # stdin is still unread: hand the process over to the regular hook
+    os.execv(sys.executable, [sys.executable, _script(hook)])
+
+
+def _fallback_run(hook: str, payload: bytes) -> int:
+    import subprocess
+    return subprocess.run([sys.executable, _script(hook)], input=payload).returncode
+
+
+def _unanswered(hook: str) -> int:
+    # The daemon may still be deciding; a PreTool that could have been blocked must
+    # not be let through (the daemon drops requests picked up after the deadline)
+    if hook == "pre_tool" and (os.environ.get("HOOKS_MODE") or "").strip().lower() == "block":
+        sys.stderr.write("Swarm1 hook daemon did not answer in time; blocking the tool call.\n")
+        return 2
+    return 0
+
+
+def main() -> int:
+    hook = sys.argv[1] if len(sys.argv) > 1 else ""
+    if hook not in HOOKS:
+        return 0
+    deadline = time.time() + TIMEOUT
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(TIMEOUT)
+        conn.connect(sock_path())
+    except (AttributeError, OSError):
+        _fallback_exec(hook)
+    payload = sys.stdin.buffer.read()
+    with conn:
+        try:
+            meta = b"\0".join([hook.encode()] + [
+                f"{k}={v}".encode("utf-8", "surrogateescape") for k, v in os.environ.items()
+            ])
+            conn.sendall(REQ.pack(len(meta), len(payload), deadline) + meta + payload)
+        except OSError:
+            # Request never reached the daemon; run it here instead
+            return _fallback_run(hook, payload)
+        try:
+            conn.settimeout(max(deadline - time.time(), 0.05))
+            code, n = RESP.unpack(recv_exact(conn, RESP.size))
+            err = recv_exact(conn, n) if n else b""
+        except OSError:
+            # Daemon took the request but did not answer; never wedge the IDE
+            return _unanswered(hook)
+    if err:
+        sys.stderr.buffer.write(err)
+        sys.stderr.flush()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
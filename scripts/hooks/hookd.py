@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Swarm1 - optional persistent hook daemon
+- Keeps hook modules, parsed registry/policies and compiled patterns warm
+- Serves requests from hookc.py over .claude/session/hookd.sock, each in a forked
+  child, so a slow hook (e.g. SubagentStop on a large log) never delays another
+- Runs each hook's main() with the caller's stdin, environment and exit code
+- Exits after HOOKD_IDLE_SECS without requests (default 900) and removes the socket
+- One daemon per project: .claude/session/hookd.pid is flock-ed for its lifetime
+
+Started in the background by session_start.py when HOOKS_DAEMON=1. Code changes
+to the hooks take effect once the daemon idles out (or is killed).
+"""
+from __future__ import annotations
+import sys, os, io, time, socket, signal, importlib, subprocess
+sys.path.insert(0, os.path.dirname(__file__))
+import common  # type: ignore
+import hookc  # type: ignore
+
+EVENTS = {
+    "pre_tool": "PreToolUse",
+    "post_tool": "PostToolUse",
+    "session_start": "SessionStart",
+    "session_end": "SessionEnd",
+    "subagent_stop": "SubagentStop",
+}
+_MODULES: dict = {}
+
+
+def _idle_secs() -> float:
+    try:
+        return float(os.getenv("HOOKD_IDLE_SECS", "") or 900)
+    except ValueError:
+        return 900.0
+
+
+def _alive() -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(0.2)
+            s.connect(hookc.sock_path())
+        return True
+    except OSError:
+        return False
+
+
+def ensure_running() -> None:
+    """Start the daemon in the background unless one already answers."""
+    if not hasattr(socket, "AF_UNIX") or _alive():
+        return
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)],
+        cwd=common.PROJECT_DIR,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        close_fds=True, start_new_session=True,
+    )
+
+
+def _preload() -> None:
+    for hook in hookc.HOOKS:
+        _MODULES[hook] = importlib.import_module(hook)
+        getattr(_MODULES[hook], "warm", lambda: None)()  # lazily compiled patterns
+    for name in ("registry.yaml", "policies.yaml"):
+        common.load_yaml_cached(os.path.join(common.PROJECT_DIR, "mcp", name))
+
+
+def _on_error(hook: str, e: Exception) -> int:
+    # Mirrors the scripts' __main__ handlers: log, count toward the breaker, allow
+    common.safe_append_jsonl({"ts": time.time(), "event": EVENTS[hook], "error": str(e)})
+    try:
+        if common.record_error(None):
+            common.trip_circuit_breaker()
+    except Exception:
+        pass
+    return 0
+
+
+def _run(hook: str, env: dict, payload: bytes) -> tuple[int, bytes]:
+    mod = _MODULES.get(hook)
+    if mod is None:
+        return 0, b""
+    saved_env = os.environ.copy()
+    saved_io = (sys.stdin, sys.stderr)
+    err = io.StringIO()
+    os.environ.clear()
+    os.environ.update(env)
+    sys.stdin = io.TextIOWrapper(io.BytesIO(payload), encoding="utf-8")
+    sys.stderr = err
+    try:
+        code = mod.main()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 0
+    except Exception as e:
+        code = _on_error(hook, e)
+    finally:
+        common.flush_log()
+        sys.stdin, sys.stderr = saved_io
+        os.environ.clear()
+        os.environ.update(saved_env)
+    return int(code or 0), err.getvalue().encode("utf-8", "replace")
+
+
+def _handle(conn: socket.socket) -> None:
+    mlen, plen, deadline = hookc.REQ.unpack(hookc.recv_exact(conn, hookc.REQ.size))
+    fields = hookc.recv_exact(conn, mlen).split(b"\0")
+    payload = hookc.recv_exact(conn, plen)
+    if time.time() > deadline:
+        return  # the client has given up (and decided); running the hook now would
+                # e.g. charge a ledger for a PreTool that was already blocked
+    hook = fields[0].decode("utf-8", "replace")
+    env = dict(
+        f.decode("utf-8", "surrogateescape").split("=", 1) for f in fields[1:] if b"=" in f
+    )
+    code, err = _run(hook, env, payload)
+    conn.sendall(hookc.RESP.pack(code, len(err)) + err)
+
+
+def _lock_pidfile(path: str):
+    """Exclusive, non-blocking flock on the pidfile; None if another daemon holds it."""
+    import fcntl
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_CLOEXEC", 0), 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, b"%d\n" % os.getpid())
+    return fd
+
+
+def _serve_child(listener: socket.socket, lock_fd: int, conn: socket.socket) -> None:
+    # Forked per connection: the warm modules are shared copy-on-write, and
+    # os.environ / sys.stdin swaps stay private to this request
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        listener.close()
+        os.close(lock_fd)  # the parent's descriptor keeps the lock
+        conn.settimeout(hookc.TIMEOUT)
+        _handle(conn)
+    except Exception:
+        pass  # a broken client only ends its own child
+    finally:
+        os._exit(0)
+
+
+def serve() -> int:
+    if not hasattr(socket, "AF_UNIX") or _alive():
+        return 0
+    path = hookc.sock_path()
+    common.mkdirs()
+    lock_fd = _lock_pidfile(os.path.join(os.path.dirname(path), "hookd.pid"))
+    if lock_fd is None:
+        return 0  # another daemon is starting or running
+    _preload()
+    try:
+        os.unlink(path)  # we hold the lock: any socket here is stale
+    except OSError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(path)
+    except OSError:
+        return 0
+    ino = os.stat(path).st_ino
+    os.chmod(path, 0o600)
+    listener.listen(16)
+    listener.settimeout(_idle_secs())
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are reaped automatically
+    try:
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                return 0
+            with conn:
+                try:
+                    if os.fork() == 0:
+                        _serve_child(listener, lock_fd, conn)
+                except OSError:
+                    continue  # fork failed; the client falls back or times out
+    finally:
+        listener.close()
+        try:
+            if os.stat(path).st_ino == ino:  # only remove the socket this daemon bound
+                os.unlink(path)
+        except OSError:
+            pass
+        os.close(lock_fd)
+
+
+if __name__ == "__main__":
+    sys.exit(serve())
@@ -6,68 +6,74 @@ Swarm1 - Claude Code PostTool hook
 - Appends a JSON line to runs/observability/hooks.jsonl
 """
 from __future__ import annotations
-import sys, os, json, time, re, pathlib
+import sys, os, time, functools
 sys.path.insert(0, os.path.dirname(__file__))
 import common  # type: ignore
 
-def _find_project_root(start):
-    cur = os.path.abspath(start)
-    for _ in range(8):
-        if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-            return cur
-        parent = os.path.dirname(cur)
-        if parent == cur:
-            break
-        cur = parent
-    return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
+@functools.lru_cache(maxsize=1)
+def _secret_pat():
+    # Compiled on first use, not at import: gated-off spawns never pay for it
+    import re
+    return re.compile(r'(api[_-]?key|token|password|secret)["\']?\s*[:=]\s*["\']?([A-Za-z0-9._-]{10,})', re.I)
 
-PROJECT_DIR = _find_project_root(os.getcwd())
+def warm() -> None:
+    """Compile the pattern now (hookd, before it forks per request)."""
+    _secret_pat()
 
-OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
-LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
-SECRET_PAT = re.compile(r'(api[_-]?key|token|password|secret)["\']?\s*[:=]\s*["\']?([A-Za-z0-9._-]{10,})', re.I)
+def _read_stdin_json() -> tuple[dict, dict | None]:
+    # Large tool_response objects are measured while streaming, never built
+    return common.read_stdin_json_streaming("tool_response", head_bytes=1000, keep=_STATUS_KEYS)
 
-def _mkdirs():
-    pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
+_STATUS_KEYS = ("status", "error")
+_FAIL_PREFIXES = ("error", "fail")
 
-def _read_stdin_json() -> dict:
-    return common.safe_read_stdin_json()
+def _failed_text(v) -> bool:
+    # Only the first 16 chars are looked at, however large the value
+    return isinstance(v, str) and v[:16].lstrip().lower().startswith(_FAIL_PREFIXES)
 
-def _log(obj: dict) -> None:
-    common.safe_append_jsonl(obj)
+def response_ok(response) -> bool:
+    """Dicts are judged by their status/error members, strings by their prefix."""
+    if response is None:
+        return False
+    if isinstance(response, dict):
+        return not response.get("error") and not _failed_text(response.get("status"))
+    return not _failed_text(response)
 
 def redact_text(s: str) -> str:
-    return SECRET_PAT.sub(r'\1:REDACTED', s)
+    return _secret_pat().sub(r'\1:REDACTED', s)
 
 def main() -> int:
-    inp = _read_stdin_json()
+    # Strict gating, before stdin is read or parsed
+    if not common.active():
+        return 0
+
+    inp, probe = _read_stdin_json()
 
     tool = inp.get("tool_name") or inp.get("tool") or ""
     session_id = inp.get("session_id") or inp.get("conversation_id") or inp.get("request_id")
     agent = os.getenv("CLAUDE_AGENT_NAME", "unknown")
     auv = os.getenv("AUV_ID")
 
-    # Strict gating
-    if common.disabled() or (not common.is_swarm()):
-        return 0
-    mode = common.get_mode()
-    if mode == "off":
-        return 0
     if not session_id:
         return 0
 
-    response = inp.get("tool_response")
-    ok = response is not None and str(response).lower().strip()[:5] not in ("error", "fail ")
-    # Compute tiny metrics
-    request_size = len(json.dumps(inp.get("tool_input", {}))) if isinstance(inp.get("tool_input"), (dict, list)) else 0
-    response_size = len(json.dumps(response)) if response is not None else 0
+    tool_input = inp.get("tool_input")
+    request_size = len(common.dumps(tool_input)) if isinstance(tool_input, (dict, list)) else 0
+    if probe is not None:
+        # Streamed object/array response: judged by its captured status/error members
+        ok = response_ok(probe["fields"])
+        response_size, head = probe["size"], probe["head"]
+    else:
+        response = inp.get("tool_response")
+        ok = response_ok(response)
+        # Compute tiny metrics; the response is serialized once for size + snippet
+        resp_blob = common.dumps(response) if response is not None else b""
+        response_size, head = len(resp_blob), resp_blob[:1000]
 
-    # sanitize a short snippet for logs
-    snippet = json.dumps(response, ensure_ascii=False) if response is not None else ""
-    snippet = snippet[:1000]
-    snippet = redact_text(snippet)
+    # sanitize a short snippet for logs ("ignore" drops a char cut in half)
+    snippet = redact_text(head.decode("utf-8", "ignore"))
 
-    _log({
+    common.safe_append_jsonl({
         "ts": time.time(),
         "event": "PostToolUse",
         "session_id": session_id,
@@ -88,7 +94,7 @@ if __name__ == "__main__":
     except Exception as e:
         # Never wedge the IDE
         try:
-            _log({"ts": time.time(), "event": "PostToolUse", "error": str(e)})
+            common.safe_append_jsonl({"ts": time.time(), "event": "PostToolUse", "error": str(e)})
         except Exception:
             pass
         # Circuit breaker (best-effort, no session id available here)
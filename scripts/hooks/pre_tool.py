@@ -11,70 +11,32 @@ Add to .claude/settings.local.json under hooks.PreToolUse (command: python "$CLA
 """
 
 from __future__ import annotations
-import sys, os, json, time, re, pathlib
+import sys, os, time, functools
 sys.path.insert(0, os.path.dirname(__file__))
 import common  # type: ignore
-from urllib.parse import urlparse
-
-# Optional dependency: PyYAML (policy/registry parsing).
-# The hook will still run if PyYAML is unavailable.
-try:
-    import yaml  # type: ignore
-except Exception:  # pragma: no cover
-    yaml = None  # fallback: skip policy/registry reads
+from common import PROJECT_DIR, LEDGER_DIR  # type: ignore
 
 # -------------------- helpers --------------------
 
-def _find_project_root(start):
-    cur = os.path.abspath(start)
-    for _ in range(8):
-        if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-            return cur
-        parent = os.path.dirname(cur)
-        if parent == cur:
-            break
-        cur = parent
-    return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
-
-PROJECT_DIR = _find_project_root(os.getcwd())
-
-OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
-LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
-LEDGER_DIR = os.path.join(OBS_DIR, "ledgers")
-
-def _mkdirs():
-    pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
-    pathlib.Path(LEDGER_DIR).mkdir(parents=True, exist_ok=True)
-
-def _read_stdin_json() -> dict:
-    return common.safe_read_stdin_json()
-
-
-def _log(obj: dict) -> None:
-    common.safe_append_jsonl(obj)
-
-def _load_yaml(p: str) -> dict:
-    if not yaml:
-        return {}
-    try:
-        with open(p, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
-    except Exception:
-        return {}
-
 def _realpath(p: str) -> str:
     try:
         return os.path.realpath(p)
     except Exception:
         return p
 
-def _within_project(path: str) -> bool:
-    rp = _realpath(path)
-    root = _realpath(PROJECT_DIR)
+@functools.lru_cache(maxsize=1)
+def _project_real() -> str:
+    # Resolved once per process instead of on every Write/Edit check
+    return _realpath(PROJECT_DIR)
+
+def _within_project(rp: str) -> bool:
+    # rp must already be resolved with _realpath
+    root = _project_real()
     # Allow inside project dir only
     return rp.startswith(root + os.sep) or rp == root
 
 def _host_from(url: str) -> str:
+    from urllib.parse import urlparse  # deferred: only HTTP-ish checks need it
     try:
         return urlparse(url).hostname or ""
     except Exception:
@@ -87,23 +49,57 @@ def _session_ledger(session_id: str | None) -> str:
     sid = session_id or "unknown"
     return os.path.join(LEDGER_DIR, f"session-{sid}.json")
 
-def _load_ledger(path: str) -> dict:
+def _lock(fd: int):
+    """Take an exclusive lock on fd (blocking); returns the matching unlock callable."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"cost_usd": 0.0, "events": 0}
-
-def _save_ledger(path: str, ledger: dict) -> None:
-    _mkdirs()
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(ledger, f, indent=2)
-
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        return lambda: (os.lseek(fd, 0, os.SEEK_SET), msvcrt.locking(fd, msvcrt.LK_UNLCK, 1))
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return lambda: fcntl.flock(fd, fcntl.LOCK_UN)
+
+def _charge_ledger(path: str, amount: float, budget: float) -> tuple[float, bool]:
+    """Read-modify-write the session ledger in one locked open, so concurrent
+    hooks cannot both spend the same budget. Returns (new_total, charged)."""
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    try:
+        fd = os.open(path, flags, 0o644)
+    except FileNotFoundError:
+        common.mkdirs(force=True)
+        fd = os.open(path, flags, 0o644)
+    try:
+        unlock = _lock(fd)
+        try:
+            buf = os.read(fd, 65536)
+            try:
+                ledger = common.loads(buf) if buf else {}
+            except Exception:
+                ledger = {}
+            if not isinstance(ledger, dict):
+                ledger = {}
+            new_total = float(ledger.get("cost_usd", 0.0)) + amount
+            if new_total > budget:
+                return new_total, False
+            ledger["cost_usd"] = new_total
+            ledger["events"] = int(ledger.get("events", 0)) + 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, common.dumps(ledger))
+            return new_total, True
+        finally:
+            unlock()
+    finally:
+        os.close(fd)
+
+# PyYAML is optional: without it both return {} and policy checks are skipped
 def _read_registry() -> dict:
-    return _load_yaml(os.path.join(PROJECT_DIR, "mcp", "registry.yaml"))
+    return common.load_yaml_cached(os.path.join(PROJECT_DIR, "mcp", "registry.yaml"))
 
 def _read_policies() -> dict:
-    return _load_yaml(os.path.join(PROJECT_DIR, "mcp", "policies.yaml"))
+    return common.load_yaml_cached(os.path.join(PROJECT_DIR, "mcp", "policies.yaml"))
 
 # -------------------- policy & safety checks --------------------
 
@@ -118,6 +114,12 @@ DANGEROUS_CMD_PATTERNS = [
     r"kubectl\s+apply\b.*\s(-f|--filename)\s+.*prod",
 ]
 
+@functools.lru_cache(maxsize=1)
+def _dangerous_re():
+    # One alternation, compiled on first use (not at import): a single scan per command
+    import re
+    return re.compile("|".join(f"(?:{p})" for p in DANGEROUS_CMD_PATTERNS), re.IGNORECASE)
+
 PROTECTED_FILES = [
     ".env", ".env.local", ".env.production", "id_rsa", "id_ed25519",
 ]
@@ -125,6 +127,21 @@ PROTECTED_DIRS = [
     "node_modules", ".git", ".github", "runs", "reports", "coverage",
 ]
 
+@functools.lru_cache(maxsize=1)
+def _protected_re():
+    # Single pass over the resolved path: "<sep>dir<sep>" anywhere or "<sep>file" at the end
+    import re
+    sep = re.escape(os.sep)
+    return re.compile(
+        f"{sep}(?:(?P<dir>{'|'.join(map(re.escape, PROTECTED_DIRS))}){sep}"
+        f"|(?P<file>{'|'.join(map(re.escape, PROTECTED_FILES))})$)"
+    )
+
+def warm() -> None:
+    """Compile the patterns now (hookd, before it forks per request)."""
+    _dangerous_re()
+    _protected_re()
+
 def is_secondary_tool(tool_id: str, registry: dict) -> bool:
     try:
         return (registry.get("tools", {}).get(tool_id, {}) or {}).get("tier") == "secondary"
@@ -175,29 +192,38 @@ def sanitize_write_target(path: str) -> tuple[bool, str | None]:
     """Ensure write/edit targets stay within project and avoid protected paths."""
     if not path:
         return True, None
-    if not _within_project(path):
+    # Resolve once; symlinks must not hide an escape or a protected target
+    rp = _realpath(path)
+    if not _within_project(rp):
         return False, f"Write/Edit path is outside project: {path}"
     # deny protected files/dirs
-    rp = _realpath(path)
-    for name in PROTECTED_FILES:
-        if rp.endswith(os.sep + name) or rp == os.path.join(_realpath(PROJECT_DIR), name):
-            return False, f"Write/Edit to protected file is not allowed: {name}"
-    for d in PROTECTED_DIRS:
-        if (os.sep + d + os.sep) in rp:
-            return False, f"Write/Edit in protected directory is not allowed: {d}"
+    m = _protected_re().search(rp)
+    if m and m.group("file"):
+        return False, f"Write/Edit to protected file is not allowed: {m.group('file')}"
+    if m:
+        return False, f"Write/Edit in protected directory is not allowed: {m.group('dir')}"
     return True, None
 
 def dangerous_shell(cmd: str) -> bool:
-    cmd_l = cmd or ""
-    for pat in DANGEROUS_CMD_PATTERNS:
-        if re.search(pat, cmd_l, flags=re.IGNORECASE):
-            return True
-    return False
+    return bool(_dangerous_re().search(cmd or ""))
+
+_COST_SIZE_CAP = 9_000  # bytes at which the estimate below saturates at 0.01
+
+def _approx_size(params) -> int:
+    """Rough payload size from top-level values; stops once the cost cap is reached."""
+    if not isinstance(params, dict):
+        return len(str(params))
+    size = 0
+    for v in params.values():
+        size += len(v) if isinstance(v, (str, bytes)) else len(str(v))
+        if size >= _COST_SIZE_CAP:
+            break
+    return size
 
 def estimate_cost_usd(tool_id: str, params: dict) -> float:
     # Conservative placeholders; refine per environment as needed.
     if tool_id in ("http", "fetch", "playwright", "lighthouse", "latency-sampler"):
-        size = len(json.dumps(params, ensure_ascii=False)) if params else 100
+        size = _approx_size(params) if params else 100
         return min(0.001 + size/1_000_000, 0.01)
     return 0.0
 
@@ -209,20 +235,29 @@ def budget_guard(session_id: str | None, amount: float, policies: dict, tool_id:
     overrides = ((policies.get("tiers") or {}).get("secondary") or {}).get("budget_overrides", {})
     budget = float(overrides.get(tool_id, secondary_default))
 
-    path = _session_ledger(session_id)
-    ledger = _load_ledger(path)
-    new_total = float(ledger.get("cost_usd", 0.0)) + amount
-    if new_total > budget:
+    new_total, charged = _charge_ledger(_session_ledger(session_id), amount, budget)
+    if not charged:
         return False, budget, f"Estimated secondary spend {new_total:.2f} > budget {budget:.2f}"
-    ledger["cost_usd"] = new_total
-    ledger["events"] = int(ledger.get("events", 0)) + 1
-    _save_ledger(path, ledger)
     return True, budget, None
 
 # -------------------- main --------------------
 
+# Tool categories, matched against the lowercased tool id
+_WRITE_TOOLS = frozenset({"write", "edit", "write_file", "edit_file"})
+_SHELL_TOOLS = frozenset({"bash", "run", "shell", "powershell"})
+_DB_TOOLS = frozenset({"postgres", "db.query", "database"})
+_HTTP_TOOLS = frozenset({"http", "fetch"})
+
 def main() -> int:
-    inp = _read_stdin_json()
+    # Global disables and strict gating, before stdin is read or parsed
+    if not common.active():
+        return 0
+    mode = common.get_mode()
+    WARN_ONLY = (mode == "warn")
+    # Advisory fields (side_effects, enrichments, params_keys) are logged only when asked for
+    VERBOSE = os.getenv("HOOKS_VERBOSE", "").lower() in ("1", "true", "yes")
+
+    inp = common.safe_read_stdin_json()
 
     # Try to accommodate multiple shapes of the hook payload
     tool_id = inp.get("tool_name") or inp.get("tool") or inp.get("name") or ""
@@ -230,14 +265,7 @@ def main() -> int:
     session_id = inp.get("session_id") or inp.get("conversation_id") or inp.get("request_id")
     agent = os.getenv("CLAUDE_AGENT_NAME", "unknown")
     auv = os.getenv("AUV_ID")
-
-    # Global disables and strict gating
-    if common.disabled() or (not common.is_swarm()):
-        return 0
-    mode = common.get_mode()
-    if mode == "off":
-        return 0
-    WARN_ONLY = (mode == "warn")
+    tid = tool_id.lower()
 
     registry = _read_registry()
     policies = _read_policies()
@@ -245,10 +273,10 @@ def main() -> int:
     # Secondary consent (block if missing)
     ok, reason = enforce_secondary_consent(tool_id, registry)
     if not ok:
-        _log({
+        common.safe_append_jsonl({
             "ts": _now(), "event": "PreToolUse", "agent": agent, "auv": auv,
             "session_id": session_id, "tool": tool_id, "blocked": (not WARN_ONLY), "reason": reason
-        })
+        }, flush=not WARN_ONLY)
         if not WARN_ONLY:
             sys.stderr.write(reason + "\n")
             return 2
@@ -264,27 +292,27 @@ def main() -> int:
                 violations.append(f"HTTP target not allowed in this environment: {v}")
 
     # Write/Edit: validate path inside project
-    if tool_id.lower() in ("write", "edit", "write_file", "edit_file"):
+    if tid in _WRITE_TOOLS:
         target = params.get("path") or params.get("file_path") or params.get("target")
         ok2, why = sanitize_write_target(target or "")
         if not ok2 and why:
             violations.append(why)
 
     # Shell/Run dangerous commands
-    if tool_id.lower() in ("bash", "run", "shell", "powershell"):
+    if tid in _SHELL_TOOLS:
         cmd = params.get("command") or params.get("cmd") or ""
         if dangerous_shell(cmd):
             violations.append("Dangerous shell pattern detected; command blocked by policy.")
 
     # Database guard (very light)
-    if tool_id.lower() in ("postgres", "db.query", "database"):
+    if tid in _DB_TOOLS:
         dsn = params.get("dsn") or os.getenv("DB_URL", "")
         if "prod" in (dsn or "").lower():
             violations.append("Refusing DB connection that appears to target production.")
 
     # Enrich defaults (best-effort advisory only)
     enrichments = {}
-    if tool_id.lower() in ("http", "fetch") and isinstance(params, dict):
+    if VERBOSE and tid in _HTTP_TOOLS and isinstance(params, dict):
         if "timeout" not in params:
             enrichments["timeout"] = 30_000  # ms
         if "headers" not in params and os.getenv("API_BASE"):
@@ -292,8 +320,9 @@ def main() -> int:
 
     # Cost estimate + budget guard
     est_cost = estimate_cost_usd(tool_id, params)
+    secondary = is_secondary_tool(tool_id, registry)
     cost_ok, budget, budget_reason = budget_guard(
-        session_id, est_cost if is_secondary_tool(tool_id, registry) else 0.0, policies, tool_id
+        session_id, est_cost if secondary else 0.0, policies, tool_id
     )
 
     # Decide
@@ -307,7 +336,7 @@ def main() -> int:
         reason_final = budget_reason
 
     # Log
-    _log({
+    event = {
         "ts": _now(),
         "event": "PreToolUse",
         "agent": agent,
@@ -317,11 +346,13 @@ def main() -> int:
         "blocked": (blocked and not WARN_ONLY),
         "reason": reason_final,
         "est_cost": round(est_cost, 6),
-        "secondary": is_secondary_tool(tool_id, registry),
-        "side_effects": tool_side_effects(tool_id, registry),
-        "enrichments": enrichments or None,
-        "params_keys": list(params.keys()) if isinstance(params, dict) else None
-    })
+        "secondary": secondary,
+    }
+    if VERBOSE:
+        event["side_effects"] = tool_side_effects(tool_id, registry)
+        event["enrichments"] = enrichments or None
+        event["params_keys"] = list(params.keys()) if isinstance(params, dict) else None
+    common.safe_append_jsonl(event, flush=(blocked and not WARN_ONLY))
 
     if blocked and not WARN_ONLY:
         if reason_final:
@@ -337,7 +368,7 @@ if __name__ == "__main__":
         # Never crash the IDE; log and allow (exit 0) to avoid wedging sessions.
         try:
             err = str(e)
-            _log({"ts": _now(), "event": "PreToolUse", "error": err})
+            common.safe_append_jsonl({"ts": _now(), "event": "PreToolUse", "error": err})
         except Exception:
             pass
         # Circuit breaker
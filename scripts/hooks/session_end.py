@@ -5,130 +5,79 @@ Swarm1 - Claude Code SessionEnd hook
 - Writes a result-card JSON under runs/<AUV-ID>/result-cards/session-<id>.json
 """
 from __future__ import annotations
-import sys, os, json, time, pathlib
+import sys, os, time
+from collections import Counter
 sys.path.insert(0, os.path.dirname(__file__))
 import common  # type: ignore
+from common import LOG_PATH  # type: ignore
 
-def _find_project_root(start):
-    cur = os.path.abspath(start)
-    for _ in range(8):
-        if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-            return cur
-        parent = os.path.dirname(cur)
-        if parent == cur:
-            break
-        cur = parent
-    return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
-
-PROJECT_DIR = _find_project_root(os.getcwd())
-
-OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
-LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
-
-def _read_stdin_json() -> dict:
-    return common.safe_read_stdin_json()
-
-
-def _iter_jsonl(path: str):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                try:
-                    yield json.loads(line)
-                except Exception:
-                    continue
-    except FileNotFoundError:
-        return
 
 def main() -> int:
-    inp = _read_stdin_json()
+    # Strict gating, before stdin is read or parsed
+    if not common.active():
+        return 0
+
+    inp = common.safe_read_stdin_json()
     session_id = inp.get("session_id") or inp.get("conversation_id") or inp.get("request_id")
     agent = os.getenv("CLAUDE_AGENT_NAME", "unknown")
     auv = os.getenv("AUV_ID")
 
-    # Strict gating
-    if common.disabled() or (not common.is_swarm()):
-        return 0
-    mode = common.get_mode()
-    if mode == "off":
-        return 0
-
     # Aggregate counts starting from saved offset to avoid heavy scans
-    per_tool = {}
-    failures = 0
-    total = 0
+    counts: Counter = Counter()  # (tool, ok) -> events
 
     try:
+        # Only the tail written since SessionStart (offset saved there) is read
         start = common.load_offset(session_id)
         size = os.path.getsize(LOG_PATH) if os.path.exists(LOG_PATH) else 0
-        if size > common.max_log_bytes():
+        if start > size:
+            # Log was truncated/rotated after SessionStart
+            start = 0
+        if size - start > common.max_log_bytes():
             # Skip heavy parse, just log summary-only end
             start = size
-        if os.path.exists(LOG_PATH) and start < size:
-            with open(LOG_PATH, "r", encoding="utf-8") as f:
-                if start > 0:
-                    f.seek(start)
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        evt = json.loads(line)
-                    except Exception:
-                        continue
-                    if evt.get("session_id") != session_id:
-                        continue
-                    if evt.get("event") == "PostToolUse":
-                        t = evt.get("tool") or "unknown"
-                        bucket = per_tool.setdefault(t, {"ok": 0, "fail": 0})
-                        if evt.get("ok"):
-                            bucket["ok"] += 1
-                        else:
-                            bucket["fail"] += 1
-                            failures += 1
-                        total += 1
-    except Exception:
-        # On any error, do a minimal summary only
-        per_tool, failures, total = {}, 0, 0
+        if start < size:
+            # The session id as serialized in log lines and the event name; a cheap
+            # byte-level prefilter so only this session's PostToolUse lines are parsed
+            needles = (common.needle(session_id),) if session_id is not None else ()
+            needles += (common.POST_TOOL_NEEDLE,)
+            counts = common.tally_tools(common.iter_jsonl(LOG_PATH, start, needles), session_id)
+    except (OSError, ValueError):
+        # Unreadable log/offset: do a minimal summary only
+        counts = Counter()
+
+    per_tool, total, failures = common.tool_summary(counts)
 
     # Write session card if AUV_ID set
+    now = time.time()  # one clock read for the card, the log line and the fallback name
     if auv:
-        cards_dir = os.path.join(PROJECT_DIR, "runs", auv, "result-cards")
-        pathlib.Path(cards_dir).mkdir(parents=True, exist_ok=True)
-        card_path = os.path.join(cards_dir, f"session-{session_id or int(time.time())}.json")
+        card_path = common.card_path(auv, f"session-{session_id or int(now)}.json")
+        card = {
+            "ts": now,
+            "event": "SessionEnd",
+            "session_id": session_id,
+            "agent": agent,
+            "summary": {
+                "total_tools": total,
+                "failures": failures,
+                "per_tool": per_tool
+            }
+        }
         try:
-            with open(card_path, "w", encoding="utf-8") as f:
-                json.dump({
-                    "ts": time.time(),
-                    "event": "SessionEnd",
-                    "session_id": session_id,
-                    "agent": agent,
-                    "summary": {
-                        "total_tools": total,
-                        "failures": failures,
-                        "per_tool": per_tool
-                    }
-                }, f, indent=2)
-        except Exception:
+            # result-cards/ is created by write_json on the first card for this AUV
+            common.write_json(card_path, card, pretty=True)
+        except OSError:
             pass
 
     # Append a final log line
-    pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
-    try:
-        with open(os.path.join(OBS_DIR, "hooks.jsonl"), "a", encoding="utf-8") as f:
-            f.write(json.dumps({
-                "ts": time.time(),
-                "event": "SessionEnd",
-                "session_id": session_id,
-                "agent": agent,
-                "auv": auv,
-                "summary_total": total,
-                "summary_failures": failures
-            }) + "\n")
-    except Exception:
-        pass
+    common.safe_append_jsonl({
+        "ts": now,
+        "event": "SessionEnd",
+        "session_id": session_id,
+        "agent": agent,
+        "auv": auv,
+        "summary_total": total,
+        "summary_failures": failures
+    })
 
     return 0
 
@@ -5,65 +5,35 @@ Swarm1 - Claude Code SessionStart hook
 - Initializes a per-session ledger file (used by PreTool for budgets)
 """
 from __future__ import annotations
-import sys, os, json, time, pathlib
+import sys, os, time
 sys.path.insert(0, os.path.dirname(__file__))
 import common  # type: ignore
-
-def _find_project_root(start):
-  cur = os.path.abspath(start)
-  for _ in range(8):
-    if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-      return cur
-    parent = os.path.dirname(cur)
-    if parent == cur:
-      break
-    cur = parent
-  return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
-
-PROJECT_DIR = _find_project_root(os.getcwd())
-OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
-LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
-LEDGER_DIR = os.path.join(OBS_DIR, "ledgers")
-
-def _mkdirs():
-  pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
-  pathlib.Path(LEDGER_DIR).mkdir(parents=True, exist_ok=True)
-
-def _read_stdin_json() -> dict:
-    return common.safe_read_stdin_json()
-
-
-def _log(obj: dict) -> None:
-  common.safe_append_jsonl(obj)
+from common import LEDGER_DIR  # type: ignore
 
 def _session_ledger(session_id: str | None) -> str:
   sid = session_id or "unknown"
   return os.path.join(LEDGER_DIR, f"session-{sid}.json")
 
 def main() -> int:
-  inp = _read_stdin_json()
+  # Strict gating, before stdin is read or parsed
+  if not common.active():
+    return 0
+
+  inp = common.safe_read_stdin_json()
   session_id = inp.get("session_id") or inp.get("conversation_id") or inp.get("request_id")
   agent = os.getenv("CLAUDE_AGENT_NAME", "unknown")
   auv = os.getenv("AUV_ID")
 
-  # Strict gating
-  if common.disabled() or (not common.is_swarm()):
-    return 0
-  mode = common.get_mode()
-  if mode == "off":
-    return 0
-
   # Initialize ledger (reset per session) only in warn/block
-  _mkdirs()
+  common.mkdirs()
   ledger_path = _session_ledger(session_id)
-  with open(ledger_path, "w", encoding="utf-8") as f:
-    json.dump({"cost_usd": 0.0, "events": 0}, f)
+  common.write_json(ledger_path, {"cost_usd": 0.0, "events": 0})
 
   # Record offset to avoid heavy scans later
   common.save_offset(session_id)
 
   # Log start
-  _log({
+  common.safe_append_jsonl({
     "ts": time.time(),
     "event": "SessionStart",
     "session_id": session_id,
@@ -74,6 +44,14 @@ def main() -> int:
       "API_BASE": os.getenv("API_BASE")
     }
   })
+
+  # Optional warm daemon for the remaining hooks of this session (see hookd.py)
+  if os.getenv("HOOKS_DAEMON", "").lower() in ("1", "true", "yes"):
+    try:
+      import hookd  # type: ignore
+      hookd.ensure_running()
+    except Exception:
+      pass
   return 0
 
 if __name__ == "__main__":
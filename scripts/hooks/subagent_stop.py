@@ -1,114 +1,77 @@
 #!/usr/bin/env python3
 """
 Swarm1 - Claude Code SubagentStop hook
-- Creates a small 'result card' summarizing the sub-agent's work
+- Appends a small 'result card' summarizing the sub-agent's work to
+  runs/<AUV-ID>/result-cards/subagent-cards.jsonl
 - Pulls stats from the observability log for the current session_id + agent
 """
 from __future__ import annotations
-import sys, os, json, time, pathlib
+import sys, os
 sys.path.insert(0, os.path.dirname(__file__))
-import common  # type: ignore
+import common_gate  # type: ignore
 
-def _find_project_root(start):
-    cur = os.path.abspath(start)
-    for _ in range(8):
-        if os.path.isdir(os.path.join(cur, ".claude")) or os.path.isdir(os.path.join(cur, "mcp")):
-            return cur
-        parent = os.path.dirname(cur)
-        if parent == cur:
-            break
-        cur = parent
-    return os.getenv("CLAUDE_PROJECT_DIR") or os.getcwd()
-
-PROJECT_DIR = _find_project_root(os.getcwd())
-
-OBS_DIR = os.path.join(PROJECT_DIR, "runs", "observability")
-LOG_PATH = os.path.join(OBS_DIR, "hooks.jsonl")
-
-def _read_stdin_json() -> dict:
-    return common.safe_read_stdin_json()
-
-def _iter_jsonl(path: str):
+def _write(path: str, data: bytes) -> None:
+    """One O_APPEND os.write on a raw fd; the parent dir is only created when the open hits ENOENT."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line=line.strip()
-                if not line: continue
-                try:
-                    yield json.loads(line)
-                except Exception:
-                    continue
+        fd = os.open(path, flags, 0o644)
     except FileNotFoundError:
-        return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, flags, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
 
 def main() -> int:
-    inp = _read_stdin_json()
+    # Strict gating: env checks before common (json, root discovery) is even imported,
+    # then the sentinel; stdin is only read once every gate has passed
+    if not common_gate.env_active():
+        return 0
+    import time
+    import common  # type: ignore
+    if not common.active():
+        return 0
+
+    inp = common.safe_read_stdin_json()
     session_id = inp.get("session_id") or inp.get("conversation_id") or inp.get("request_id")
     agent = os.getenv("CLAUDE_AGENT_NAME", "unknown")
     auv = os.getenv("AUV_ID") or "AUV-unknown"
 
-    # Strict gating
-    if common.disabled() or (not common.is_swarm()):
-        return 0
-    mode = common.get_mode()
-    if mode == "off":
-        return 0
-
-    per_tool = {}
-    failures = 0
-    total = 0
-    for evt in _iter_jsonl(LOG_PATH):
-        if evt.get("session_id") != session_id:
-            continue
-        if evt.get("event") != "PostToolUse":
-            continue
-        if evt.get("agent") != agent:
-            continue
-        t = evt.get("tool") or "unknown"
-        bucket = per_tool.setdefault(t, {"ok": 0, "fail": 0})
-        if evt.get("ok"):
-            bucket["ok"] += 1
-        else:
-            bucket["fail"] += 1
-            failures += 1
-        total += 1
+    # Only PostToolUse lines mentioning both this session and this agent are parsed;
+    # hooks.idx points straight at the session's lines, the full scan is the fallback
+    tail = (common.needle(agent), common.POST_TOOL_NEEDLE)
+    events = common.read_indexed(session_id, tail) if session_id is not None else None
+    if events is None:
+        needles = tail if session_id is None else (common.needle(session_id),) + tail
+        # The session's events all follow the log size saved at its SessionStart
+        start = common.load_offset(session_id) if session_id is not None else 0
+        if start and start > (os.path.getsize(common.LOG_PATH) if os.path.exists(common.LOG_PATH) else 0):
+            start = 0  # log truncated/rotated since SessionStart
+        events = common.iter_jsonl(common.LOG_PATH, start, needles)
+    per_tool, total, failures = common.tool_summary(common.tally_tools(events, session_id, agent))
+    if total == 0 and not common.emit_empty_cards():
+        return 0  # nothing to report; no card, no log line
 
-    # Write a subagent result card
-    cards_dir = os.path.join(PROJECT_DIR, "runs", auv, "result-cards")
-    pathlib.Path(cards_dir).mkdir(parents=True, exist_ok=True)
-    card_path = os.path.join(cards_dir, f"subagent-{agent}-{session_id or int(time.time())}.json")
+    # Build both payloads first, then write the card and the log line back to back
+    now = time.time()  # one clock read for the card and the log line
+    # Cards are appended to one NDJSON file per AUV (see common.read_subagent_card)
+    card_path = common.card_path(auv, common.SUBAGENT_CARDS)
+    head = {"ts": now, "event": "SubagentStop", "session_id": session_id, "agent": agent, "auv": auv}
     try:
-        with open(card_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "ts": time.time(),
-                "event": "SubagentStop",
-                "session_id": session_id,
-                "agent": agent,
-                "auv": auv,
-                "summary": {
-                    "total_tools": total,
-                    "failures": failures,
-                    "per_tool": per_tool
-                }
-            }, f, indent=2)
-    except Exception:
-        pass
+        _write(card_path, common.dumps({
+            **head,
+            "summary": {
+                "total_tools": total,
+                "failures": failures,
+                "per_tool": per_tool
+            }
+        }) + b"\n")
+    except OSError:
+        pass  # the log line below still records the summary
 
-    # Also append a log line
-    pathlib.Path(OBS_DIR).mkdir(parents=True, exist_ok=True)
-    try:
-        with open(os.path.join(OBS_DIR, "hooks.jsonl"), "a", encoding="utf-8") as f:
-            f.write(json.dumps({
-                "ts": time.time(),
-                "event": "SubagentStop",
-                "session_id": session_id,
-                "agent": agent,
-                "auv": auv,
-                "summary_total": total,
-                "summary_failures": failures
-            }) + "\n")
-    except Exception:
-        pass
+    # Same header fields as the card; through the shared writer (indexed, one append)
+    common.safe_append_jsonl({**head, "summary_total": total, "summary_failures": failures})
 
     return 0
 
@@ -118,6 +81,7 @@ if __name__ == "__main__":
     except Exception:
         # Circuit breaker (session_id unknown here)
         try:
+            import common  # type: ignore
             if common.record_error(None):
                 common.trip_circuit_breaker()
         except Exception:
@@ -0,0 +1,24 @@
+"""
+Importing common must stay cheap: the optional encoders are loaded on first use,
+never at import (gated-off hooks exit right after importing it).
+
+  python -m unittest discover -s tests/hooks
+"""
+import os, sys, subprocess, unittest
+
+HOOKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "hooks")
+
+
+class CommonImportTest(unittest.TestCase):
+
+  def test_import_loads_no_optional_dependency(self):
+    code = (
+      "import sys; sys.path.insert(0, sys.argv[1]); import common; "
+      "print(','.join(m for m in ('orjson', 'ijson', 'yaml', 'mmap') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code, HOOKS], capture_output=True, text=True, check=True)
+    self.assertEqual(out.stdout.strip(), "")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,168 @@
+"""
+hooks.idx: read_indexed must return exactly what a scan of hooks.jsonl finds, or
+None (callers then scan) whenever the index cannot vouch for the whole session.
+
+  python -m unittest discover -s tests/hooks
+"""
+import os, sys, shutil, tempfile, unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "hooks"))
+import common  # type: ignore
+
+
+class IndexTest(unittest.TestCase):
+
+  def setUp(self):
+    root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, root, True)
+    obs = os.path.join(root, "runs", "observability")
+    patcher = mock.patch.multiple(
+      common,
+      OBS_DIR=obs,
+      LOG_PATH=os.path.join(obs, "hooks.jsonl"),
+      IDX_PATH=os.path.join(obs, "hooks.idx"),
+      LEDGER_DIR=os.path.join(obs, "ledgers"),
+      SESSION_DIR=os.path.join(root, ".claude", "session"),
+      SENTINELS_DIR=os.path.join(root, ".claude"),
+      CB_SENTINEL=os.path.join(root, ".claude", "hooks.disabled"),
+      _LOG_FD=None, _IDX_FD=None, _DIRS_READY=False,
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.addCleanup(common._close_log)
+
+  def _log(self, session_id, n, flush=True):
+    for i in range(n):
+      common.safe_append_jsonl({"event": "PostToolUse", "session_id": session_id, "agent": "a",
+                                "tool": "T", "ok": i % 3 != 0, "n": i})
+    if flush:
+      common.flush_log()
+
+  def _scan(self, session_id):
+    return [e for e in common.iter_jsonl(common.LOG_PATH, needles=(common.needle(session_id),))
+            if e.get("session_id") == session_id]
+
+  def _overwrite(self, path, offset, data):
+    with open(path, "r+b") as f:
+      f.seek(offset)
+      f.write(data)
+
+  def test_matches_scan(self):
+    common.save_offset("s")
+    self._log("s", 5)
+    self._log("t", 3)
+    self._log("s", 2)
+    self.assertEqual(common.read_indexed("s"), self._scan("s"))
+    self.assertEqual(len(common.read_indexed("s")), 7)
+
+  def test_starts_at_the_index_position_saved_at_session_start(self):
+    self._log("t", 20)
+    common.save_offset("s")
+    self._log("s", 4)
+    # Records written before SessionStart are never read: garble all of them
+    with open(common.IDX_PATH, "rb") as f:
+      head = len(f.readline())
+    _ino, pos = common._offset_record("s")["idx"]
+    self._overwrite(common.IDX_PATH, head, b"x" * (pos - 1 - head))
+    self.assertEqual(common.read_indexed("s"), self._scan("s"))
+    self.assertEqual(len(common.read_indexed("s")), 4)
+
+  def test_rotated_log_inode(self):
+    common.save_offset("s")
+    self._log("s", 3)
+    common._close_log()
+    moved = common.LOG_PATH + ".1"
+    shutil.copyfile(common.LOG_PATH, moved)
+    os.replace(moved, common.LOG_PATH)  # same bytes, another inode
+    self.assertIsNone(common.read_indexed("s"))
+
+  def test_base_after_session_offset(self):
+    common.save_offset("s")
+    self._log("t", 3)
+    common._close_log()
+    os.unlink(common.IDX_PATH)  # next writer starts a new index past t's lines
+    self._log("s", 2)
+    self.assertIsNone(common.read_indexed("s"))
+    self.assertEqual(len(self._scan("s")), 2)
+
+  def test_crc_mismatch(self):
+    common.save_offset("s")
+    self._log("s", 3)
+    with open(common.LOG_PATH, "rb") as f:
+      data = f.read()
+    at = data.index(b'"n":1')
+    self._overwrite(common.LOG_PATH, at, b'"n":7')  # same length, other content
+    self.assertIsNone(common.read_indexed("s"))
+
+  def test_duplicate_offset(self):
+    common.save_offset("s")
+    self._log("s", 2)
+    with open(common.IDX_PATH, "rb") as f:
+      last = f.read().splitlines(True)[-1]
+    with open(common.IDX_PATH, "ab") as f:
+      f.write(last)
+    self.assertIsNone(common.read_indexed("s"))
+
+  def test_failed_flush_rebases_the_index(self):
+    common.save_offset("s")
+    self._log("s", 2)
+    with mock.patch.object(common, "_append_index", return_value=False):
+      self._log("s", 2)
+    with open(common.IDX_PATH, "rb") as f:
+      base, _ino = common._idx_head(f.readline())
+    self.assertEqual(base, os.path.getsize(common.LOG_PATH))
+    self.assertIsNone(common.read_indexed("s"))
+    self.assertEqual(len(self._scan("s")), 4)
+    # Sessions starting after the rebase are indexed again
+    common.save_offset("u")
+    self._log("u", 3)
+    self.assertEqual(common.read_indexed("u"), self._scan("u"))
+
+  def test_failed_index_open_rebases_the_index(self):
+    common.save_offset("s")
+    self._log("s", 1)
+    common._close_log()
+    with mock.patch.object(common, "_idx_fd", side_effect=OSError("unavailable")):
+      self._log("s", 1)
+    self.assertIsNone(common.read_indexed("s"))
+
+  def _run_writers(self, failing):
+    # Separate processes appending (and indexing) at once; `failing` of them drop
+    # one index append in ten
+    code = (
+      "import sys, random; sys.path.insert(0, sys.argv[1]); import common\n"
+      "obs, sess, w = sys.argv[2], sys.argv[3], int(sys.argv[4])\n"
+      "common.OBS_DIR, common.SESSION_DIR = obs, sess\n"
+      "common.LOG_PATH, common.IDX_PATH = obs + '/hooks.jsonl', obs + '/hooks.idx'\n"
+      "real = common._append_index; random.seed(w)\n"
+      "if w < int(sys.argv[5]):\n"
+      "  common._append_index = lambda *a: real(*a) if random.random() > 0.1 else False\n"
+      "for n in range(40):\n"
+      "  common.safe_append_jsonl({'event': 'PostToolUse', 'session_id': 's%d' % (n % 3),"
+      " 'agent': 'a', 'tool': 'T', 'ok': True, 'w': w, 'pad': 'x' * (n * w % 50)},"
+      " flush=n % 4 == 0)\n"
+    )
+    import subprocess
+    hooks = os.path.dirname(common.__file__)
+    os.makedirs(common.OBS_DIR)
+    for sid in ("s0", "s1", "s2"):
+      common.save_offset(sid)
+    procs = [subprocess.Popen([sys.executable, "-c", code, hooks, common.OBS_DIR, common.SESSION_DIR,
+                               str(w), str(failing)]) for w in range(12)]
+    for p in procs:
+      self.assertEqual(p.wait(), 0)
+    return {sid: (common.read_indexed(sid), self._scan(sid)) for sid in ("s0", "s1", "s2")}
+
+  def test_concurrent_writers_match_scan(self):
+    for sid, (indexed, scanned) in self._run_writers(0).items():
+      self.assertEqual(len(scanned), 12 * len(range(int(sid[1]), 40, 3)), sid)
+      self.assertEqual(indexed, scanned, sid)
+
+  def test_concurrent_writers_with_failed_appends_never_undercount(self):
+    for sid, (indexed, scanned) in self._run_writers(3).items():
+      self.assertIn(indexed, (None, scanned), sid)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,84 @@
+"""
+PostTool success verdict: the streamed path (payloads of STREAM_MIN_BYTES or more,
+judged from _JsonProbe fields) must agree with the full-parse path. The threshold
+is lowered to 4 KB here so the streamed payloads stay small.
+
+  python -m unittest discover -s tests/hooks
+"""
+import io, os, sys, json, unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "hooks"))
+import common  # type: ignore
+import post_tool  # type: ignore
+
+try:
+  import ijson  # type: ignore  # noqa: F401
+except ImportError:
+  ijson = None
+
+RESPONSES = [
+  {"out": "ok"},
+  {"error": None, "out": "ok"},
+  {"error": {}, "out": "ok"},
+  {"error": [], "out": "ok"},
+  {"error": "", "out": "ok"},
+  {"error": {"code": 1}, "out": "ok"},
+  {"error": [0], "out": "ok"},
+  {"error": [[]], "out": "ok"},
+  {"error": "boom", "out": "ok"},
+  {"status": "Failed: exit 1"},
+  {"status": "ok", "nested": {"error": "ignored below top level"}},
+  {"status": {"error": "x"}},
+]
+
+
+def _read(payload: dict):
+  saved = sys.stdin
+  sys.stdin = io.TextIOWrapper(io.BytesIO(json.dumps(payload).encode()), encoding="utf-8")
+  try:
+    return post_tool._read_stdin_json()
+  finally:
+    sys.stdin = saved
+
+
+def _verdict(response: dict, pad: int) -> tuple:
+  padded = dict(response, out=(response.get("out") or "") + "x" * pad)
+  inp, probe = _read({"session_id": "s", "tool_name": "T", "tool_response": padded})
+  ok = post_tool.response_ok(probe["fields"] if probe is not None else inp.get("tool_response"))
+  return ok, probe is not None
+
+
+class ProbeParityTest(unittest.TestCase):
+
+  def setUp(self):
+    patcher = mock.patch.object(common, "STREAM_MIN_BYTES", 4096)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  @unittest.skipIf(ijson is None, "ijson not installed; every payload is parsed whole")
+  def test_verdict_matches_across_stream_threshold(self):
+    for response in RESPONSES:
+      with self.subTest(response=response):
+        small, streamed_small = _verdict(response, 0)
+        large, streamed_large = _verdict(response, common.STREAM_MIN_BYTES)
+        self.assertFalse(streamed_small)
+        self.assertTrue(streamed_large)
+        self.assertEqual(small, large)
+        self.assertEqual(small, post_tool.response_ok(response))
+
+  def test_payload_ijson_rejects_is_parsed_whole(self):
+    # Valid JSON (JSON.stringify emits integers in 2^63..1e21 like this) that the
+    # yajl2_c backend fails on with "integer overflow"
+    for response in ({"id": 12345678901234567000, "out": "ok"},
+                     {"id": 12345678901234567000, "error": "boom"}):
+      with self.subTest(response=response):
+        padded = dict(response, out="x" * common.STREAM_MIN_BYTES)
+        inp, probe = _read({"session_id": "s", "tool_name": "T", "tool_response": padded})
+        self.assertEqual(inp.get("session_id"), "s")
+        self.assertEqual(post_tool.response_ok(probe["fields"] if probe is not None else inp["tool_response"]),
+                         post_tool.response_ok(response))
+
+
+if __name__ == "__main__":
+  unittest.main()